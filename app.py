@@ -1,3 +1,5 @@
+import io
+
 import altair as alt
 import streamlit as st
 import pandas as pd
@@ -12,120 +14,252 @@ st.set_page_config(
 # -----------------------------
 # Helper functions
 # -----------------------------
-def compute_health_scores(df, weights):
-    df = df.copy()
-
-    # Defensive defaults
-    df["ARR"] = pd.to_numeric(df["ARR"], errors="coerce").fillna(0)
-    df["NPS"] = pd.to_numeric(df["NPS"], errors="coerce").fillna(0)
-    df["Tickets_Last_90d"] = pd.to_numeric(df["Tickets_Last_90d"], errors="coerce").fillna(0)
-    df["CSAT"] = pd.to_numeric(df["CSAT"], errors="coerce").fillna(0)
-    df["Logins_Last_30d"] = pd.to_numeric(df["Logins_Last_30d"], errors="coerce").fillna(0)
-    df["Active_Users"] = pd.to_numeric(df["Active_Users"], errors="coerce").fillna(0)
-    df["Total_Seats"] = pd.to_numeric(df["Total_Seats"], errors="coerce").fillna(1)  # avoid div by 0
-
-    # Usage % (0–1)
-    df["Usage_Ratio"] = (df["Active_Users"] / df["Total_Seats"]).clip(0, 1)
-
-    # Normalize features into 0–1 scores
-    # Higher is better: NPS, CSAT, Usage, Logins
-    df["score_nps"] = (df["NPS"].clip(-100, 100) + 100) / 200.0
-    df["score_csat"] = df["CSAT"].clip(1, 5) / 5.0
-    df["score_usage"] = df["Usage_Ratio"]
-    df["score_logins"] = (df["Logins_Last_30d"] / df["Logins_Last_30d"].max()).fillna(0)
+REQUIRED_COLS = [
+    "Customer",
+    "Segment",
+    "ARR",
+    "Renewal_Date",
+    "NPS",
+    "Tickets_Last_90d",
+    "CSAT",
+    "Logins_Last_30d",
+    "Active_Users",
+    "Total_Seats",
+]
 
-    # Lower is better: Tickets (we invert)
-    df["score_tickets"] = 1 - (df["Tickets_Last_90d"] / df["Tickets_Last_90d"].max()).fillna(0)
-    df["score_tickets"] = df["score_tickets"].clip(0, 1)
 
-    # Weighted composite score (0–100)
-    w = weights
-    df["Health_Score"] = (
-        df["score_nps"] * w["nps"]
-        + df["score_csat"] * w["csat"]
-        + df["score_usage"] * w["usage"]
-        + df["score_logins"] * w["logins"]
-        + df["score_tickets"] * w["tickets"]
-    )
+NUMERIC_COLS = [
+    "ARR",
+    "NPS",
+    "Tickets_Last_90d",
+    "CSAT",
+    "Logins_Last_30d",
+    "Active_Users",
+    "Total_Seats",
+]
 
-    df["Health_Score"] = (df["Health_Score"] / sum(w.values()) * 100).round(1)
 
-    # Buckets
-    df["Health_Band"] = pd.cut(
-        df["Health_Score"],
-        bins=[-1, 49.9, 74.9, 100],
-        labels=["Red", "Yellow", "Green"]
-    )
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_data(source):
+    # source is either the uploaded file's bytes or a path to a CSV on disk
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_csv(source)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def clean_data(source, today):
+    # Keep only the required columns so extra CSV columns aren't pickled into
+    # every cached cleaned/scored frame (the full parse is shared with the
+    # raw preview, so this trims the cached frames rather than the read)
+    df = load_data(source)[REQUIRED_COLS]
 
-    # Renewal horizon (days) – FIXED
+    # Renewal horizon (days)
     # 1) Convert Renewal_Date to proper pandas datetime
-    df["Renewal_Date"] = pd.to_datetime(df["Renewal_Date"], errors="coerce")
+    renewal_date = pd.to_datetime(df["Renewal_Date"], errors="coerce")
+
+    # 2) Subtract "today" as day-resolution datetime64 to get whole days
+    #    (today is an argument so the cached result rolls over with the date)
+    renewal_day = renewal_date.to_numpy().astype("datetime64[D]")
+    days_to_renewal = (renewal_day - np.datetime64(today, "D")).astype("int64")
+
+    # 3) Missing dates have no horizon
+    missing_date = np.isnat(renewal_day)
+    if missing_date.any():
+        days_to_renewal = np.where(missing_date, np.nan, days_to_renewal)
+
+    # Defensive defaults: only columns the CSV parser left as text need
+    # coercing, then every gap is filled with 0 in one block operation
+    # (0 seats -> 0 usage)
+    numeric = df[NUMERIC_COLS]
+    text_cols = [c for c in NUMERIC_COLS if not pd.api.types.is_numeric_dtype(numeric[c])]
+    if text_cols:
+        numeric = numeric.assign(**{
+            c: pd.to_numeric(numeric[c], errors="coerce") for c in text_cols
+        })
+    numeric = numeric.fillna(0)
+
+    # Cleaned columns, written in one pass
+    return df.assign(
+        **numeric.to_dict("series"),
+        # Low-cardinality label used for filtering
+        Segment=df["Segment"].astype("category"),
+        Renewal_Date=renewal_date,
+        Days_to_Renewal=days_to_renewal,
+    )
 
-    # 2) Use a pandas Timestamp for "today"
-    today_ts = pd.Timestamp.today().normalize()  # midnight today
 
-    # 3) Subtract to get a Timedelta series, THEN use .dt.days
-    df["Days_to_Renewal"] = (df["Renewal_Date"] - today_ts).dt.days
+SCORE_FEATURES = ("nps", "csat", "usage", "logins", "tickets")
+SCORE_COLUMNS = ["NPS", "CSAT", "Active_Users", "Logins_Last_30d", "Tickets_Last_90d"]
 
 
-    return df
+@st.cache_data(show_spinner=False, max_entries=32)
+def compute_health_scores(source, weights, today):
+    # weights is a tuple of (name, weight) pairs so it hashes stably
+    df = clean_data(source, today)
 
+    # Raw features, one column per SCORE_FEATURES entry (column-major so each
+    # feature is contiguous); every normalization below runs in place on its
+    # column, so the weighted sum is a single matrix-vector product
+    scores = np.asfortranarray(df[SCORE_COLUMNS].to_numpy(dtype="float64"))
+    nps, csat, usage, logins, tickets = scores.T
 
-def expansion_potential(row):
-    if row["Health_Band"] == "Green" and row["Usage_Ratio"] > 0.7 and row["NPS"] >= 50:
-        return "High"
-    if row["Health_Band"] == "Yellow" and row["Usage_Ratio"] > 0.5 and row["NPS"] >= 20:
-        return "Medium"
-    return "Low"
+    # Higher is better: NPS, CSAT, Usage, Logins
+    np.clip(nps, -100, 100, out=nps)
+    nps += 100
+    nps /= 200.0
+
+    np.clip(csat, 1, 5, out=csat)
+    csat /= 5.0
+
+    # Usage % (0–1); accounts without a seat count have no measurable usage
+    seats = df["Total_Seats"].to_numpy(dtype="float64")
+    has_seats = seats > 0
+    np.divide(usage, seats, out=usage, where=has_seats)
+    usage[~has_seats] = 0.0
+    np.clip(usage, 0, 1, out=usage)
+
+    logins_max = logins.max(initial=0)
+    if logins_max > 0:
+        logins /= logins_max
+    else:
+        logins[:] = 0.0  # no logins anywhere (avoid 0 / 0)
 
+    # Lower is better: Tickets (we invert)
+    tickets_max = tickets.max(initial=0)
+    if tickets_max > 0:
+        tickets /= tickets_max
+        np.subtract(1, tickets, out=tickets)
+        np.clip(tickets, 0, 1, out=tickets)
+    else:
+        tickets[:] = 1.0  # no tickets anywhere (avoid 0 / 0)
 
-def renewal_risk(row):
-    if row["Health_Band"] == "Red":
-        return "High"
-    if row["Health_Band"] == "Yellow":
-        return "Medium"
-    return "Low"
+    # Weighted composite score (0–100)
+    w = dict(weights)
+    w_arr = np.array([w[k] for k in SCORE_FEATURES])
+    w_total = w_arr.sum()
+    if w_total > 0:
+        health_score = np.round(scores @ w_arr / w_total * 100, 1)
+    else:
+        health_score = np.full(len(df), np.nan)  # all weights at zero
+
+    # Buckets: <= 49.9 Red, <= 74.9 Yellow, else Green
+    # (ordered categorical: Red < Yellow < Green; no score -> no band)
+    band_codes = np.searchsorted([49.9, 74.9], health_score)
+    band_codes[np.isnan(health_score)] = -1
+    health_band = pd.Categorical.from_codes(
+        band_codes, categories=["Red", "Yellow", "Green"], ordered=True
+    )
 
+    df = df.assign(
+        Usage_Ratio=usage,
+        Health_Score=health_score,
+        Health_Band=health_band,
+        # Rule-based labels and playbook (callables see the columns above)
+        Expansion_Potential=expansion_potential,
+        Renewal_Risk=renewal_risk,
+        Recommended_Actions=recommended_actions,
+    )
 
-def recommended_actions(row):
-    actions = []
+    # Lowest health first; sorted once here so filtered views keep the order
+    return df.sort_values("Health_Score", kind="stable")
 
-    # Health-based
-    if row["Health_Band"] == "Red":
-        actions.append("Schedule executive-sponsored escalation and detailed recovery plan.")
-    elif row["Health_Band"] == "Yellow":
-        actions.append("Run focused health check and align on 90-day success plan.")
-    else:
-        actions.append("Reinforce value with EBR/QBR and explore expansion paths.")
 
-    # Usage
-    if row["Usage_Ratio"] < 0.4:
-        actions.append("Low adoption: run enablement sessions and map more use cases.")
-    elif row["Usage_Ratio"] > 0.8:
-        actions.append("High adoption: discuss seat expansion or advanced modules.")
+LEVELS = ["Low", "Medium", "High"]
 
-    # Tickets
-       # Tickets – flag high volume based on a simple threshold
-    # You can tune the 40 value based on your data.
-    if row["Tickets_Last_90d"] >= 40:
-        actions.append("High support volume: review top ticket themes and propose fixes.")
 
+def expansion_potential(df):
+    high = (df["Health_Band"] == "Green") & (df["Usage_Ratio"] > 0.7) & (df["NPS"] >= 50)
+    medium = (df["Health_Band"] == "Yellow") & (df["Usage_Ratio"] > 0.5) & (df["NPS"] >= 20)
+    levels = np.select([high, medium], ["High", "Medium"], default="Low")
+    return pd.Categorical(levels, categories=LEVELS, ordered=True)
 
-    # NPS / CSAT
-    if row["NPS"] < 0:
-        actions.append("Negative NPS: hold stakeholder interviews and address pain points.")
-    elif row["NPS"] >= 50:
-        actions.append("Promoter: invite to reference program or case study.")
 
-    if row["CSAT"] < 3.5:
-        actions.append("Improve support quality: review SLAs and support playbook.")
+def renewal_risk(df):
+    levels = np.select(
+        [df["Health_Band"] == "Red", df["Health_Band"] == "Yellow"],
+        ["High", "Medium"],
+        default="Low",
+    )
+    return pd.Categorical(levels, categories=LEVELS, ordered=True)
+
 
+# Playbook messages, in the order they're listed for an account
+ACTION_MESSAGES = [
+    # Health-based
+    "Schedule executive-sponsored escalation and detailed recovery plan.",
+    "Run focused health check and align on 90-day success plan.",
+    "Reinforce value with EBR/QBR and explore expansion paths.",
+    # Usage
+    "Low adoption: run enablement sessions and map more use cases.",
+    "High adoption: discuss seat expansion or advanced modules.",
+    # Tickets
+    "High support volume: review top ticket themes and propose fixes.",
+    # NPS / CSAT
+    "Negative NPS: hold stakeholder interviews and address pain points.",
+    "Promoter: invite to reference program or case study.",
+    "Improve support quality: review SLAs and support playbook.",
     # Renewal
-    days = row.get("Days_to_Renewal")
-    if pd.notnull(days) and days <= 120:
-        actions.append("Renewal <120 days: lock in mutual success plan and early commit.")
+    "Renewal <120 days: lock in mutual success plan and early commit.",
+]
 
-    return " • ".join(actions)
+
+def action_message(code):
+    # Bit i set in code -> ACTION_MESSAGES[i] applies
+    return " • ".join(m for i, m in enumerate(ACTION_MESSAGES) if code >> i & 1)
+
+
+def recommended_actions(df):
+    red = (df["Health_Band"] == "Red").to_numpy()
+    yellow = (df["Health_Band"] == "Yellow").to_numpy()
+
+    # One rule per ACTION_MESSAGES entry, same order
+    rules = [
+        red,
+        yellow,
+        ~(red | yellow),
+        df["Usage_Ratio"] < 0.4,
+        df["Usage_Ratio"] > 0.8,
+        # Tickets – flag high volume based on a simple threshold
+        # You can tune the 40 value based on your data.
+        df["Tickets_Last_90d"] >= 40,
+        df["NPS"] < 0,
+        df["NPS"] >= 50,
+        df["CSAT"] < 3.5,
+        df["Days_to_Renewal"] <= 120,  # NaN days compare as False
+    ]
+
+    # Encode the rules that fire for each account as a bit pattern
+    codes = np.zeros(len(df), dtype=np.uint16)
+    for bit, fired in enumerate(rules):
+        codes |= np.asarray(fired, dtype=np.uint16) << bit
+
+    # Only a handful of rule combinations actually occur, so each joined
+    # string is built once and looked up for every account sharing it
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    messages = np.array([action_message(c) for c in unique_codes.tolist()], dtype=object)
+    return messages[inverse]
+
+
+def category_mask(values, selected):
+    # Compare integer category codes instead of label strings; labels that
+    # aren't categories (-1) are dropped so missing values never match
+    codes = values.cat.categories.get_indexer(selected)
+    return np.isin(values.cat.codes.to_numpy(), codes[codes >= 0])
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def filter_mask(_df, scores_key, segments, bands, risks):
+    # _df isn't hashed; scores_key is a small fingerprint of the inputs that
+    # produced it (never the raw upload bytes, which would be re-hashed on
+    # every lookup).
+    # The mask is stored bit-packed to keep cache entries small.
+    mask = (
+        category_mask(_df["Segment"], segments)
+        & category_mask(_df["Health_Band"], bands)
+        & category_mask(_df["Renewal_Risk"], risks)
+    )
+    return np.packbits(mask)
 
 
 # -----------------------------
@@ -169,46 +303,45 @@ st.caption(
     "Built by Sai Tankala – Sr. Customer Success & Service Experience Leader."
 )
 
-# Load data
+# Load data (cached on the file contents, so slider changes skip parsing)
+# source_id is a compact stand-in for the contents: the upload's file_id
+# (fixed for the life of that upload) or the sample path
 if uploaded_file is not None:
-    df_raw = pd.read_csv(uploaded_file)
+    source = uploaded_file.getvalue()
+    source_id = uploaded_file.file_id
 else:
-    df_raw = pd.read_csv("sample_data.csv")
-
-required_cols = [
-    "Customer",
-    "Segment",
-    "ARR",
-    "Renewal_Date",
-    "NPS",
-    "Tickets_Last_90d",
-    "CSAT",
-    "Logins_Last_30d",
-    "Active_Users",
-    "Total_Seats",
-]
+    source = "sample_data.csv"
+    source_id = source
+df_raw = load_data(source)
 
-missing = [c for c in required_cols if c not in df_raw.columns]
+missing = [c for c in REQUIRED_COLS if c not in df_raw.columns]
 if missing:
     st.error(f"Missing required columns in CSV: {missing}")
     st.stop()
 
-df = compute_health_scores(df_raw, weights)
-df["Expansion_Potential"] = df.apply(expansion_potential, axis=1)
-df["Renewal_Risk"] = df.apply(renewal_risk, axis=1)
-df["Recommended_Actions"] = df.apply(recommended_actions, axis=1)
+weights_key = tuple(weights.items())
+today = datetime.today().date()
+df = compute_health_scores(source, weights_key, today)
 
 # -----------------------------
 # KPI summary row
 # -----------------------------
 col1, col2, col3, col4 = st.columns(4)
 
-total_arr = df["ARR"].sum()
-at_risk_arr = df.loc[df["Health_Band"].isin(["Red", "Yellow"]), "ARR"].sum()
+# One pass over ARR per band serves the KPIs and both charts
+# (dropna keeps accounts without a band in the totals)
+band_summary = (
+    df.groupby("Health_Band", observed=False, dropna=False)["ARR"]
+    .agg(["sum", "size"])
+)
+
+total_arr = band_summary["sum"].sum()
+at_risk_arr = band_summary.loc[["Red", "Yellow"], "sum"].sum()
 
-near_term_mask = df["Days_to_Renewal"].between(0, 180, inclusive="both")
+days_to_renewal = df["Days_to_Renewal"].to_numpy()
+near_term_mask = (days_to_renewal >= 0) & (days_to_renewal <= 180)  # NaN -> False
 near_term_arr = df.loc[near_term_mask, "ARR"].sum()
-red_customers = (df["Health_Band"] == "Red").sum()
+red_customers = band_summary.loc["Red", "size"]
 
 with col1:
     st.metric("Total ARR", f"${total_arr:,.0f}")
@@ -231,13 +364,7 @@ band_colors = ["#2ecc71", "#f1c40f", "#e74c3c"]  # green, yellow, red
 
 with left_col:
     st.subheader("Health Band Distribution")
-    band_counts = (
-        df["Health_Band"]
-        .value_counts()
-        .reindex(band_order)
-        .fillna(0)
-        .reset_index()
-    )
+    band_counts = band_summary.loc[band_order, "size"].reset_index()
     band_counts.columns = ["Health_Band", "Count"]
 
     chart1 = (
@@ -257,13 +384,7 @@ with left_col:
 
 with right_col:
     st.subheader("ARR by Health Band")
-    arr_by_band = (
-        df.groupby("Health_Band")["ARR"]
-        .sum()
-        .reindex(band_order)
-        .fillna(0)
-        .reset_index()
-    )
+    arr_by_band = band_summary.loc[band_order, "sum"].reset_index()
     arr_by_band.columns = ["Health_Band", "ARR"]
 
     chart2 = (
@@ -287,10 +408,12 @@ with right_col:
 # -----------------------------
 st.subheader("Account-level view")
 
+# Categories are inferred sorted when Segment is cast in clean_data
+segments = df["Segment"].cat.categories.tolist()
 seg_filter = st.multiselect(
     "Filter by Segment",
-    options=sorted(df["Segment"].unique()),
-    default=sorted(df["Segment"].unique())
+    options=segments,
+    default=segments
 )
 
 band_filter = st.multiselect(
@@ -305,11 +428,14 @@ risk_filter = st.multiselect(
     default=["Low", "Medium", "High"],
 )
 
-filtered = df[
-    df["Segment"].isin(seg_filter)
-    & df["Health_Band"].isin(band_filter)
-    & df["Renewal_Risk"].isin(risk_filter)
-]
+packed_mask = filter_mask(
+    df,
+    (source_id, weights_key, today),
+    tuple(sorted(seg_filter)),
+    tuple(sorted(band_filter)),
+    tuple(sorted(risk_filter)),
+)
+filtered = df[np.unpackbits(packed_mask, count=len(df)).astype(bool)]
 
 display_cols = [
     "Customer",
@@ -328,7 +454,14 @@ display_cols = [
     "Recommended_Actions",
 ]
 
-st.dataframe(filtered[display_cols].sort_values("Health_Score", ascending=True))
+# Already sorted by Health_Score; Renewal_Date stays datetime64 and is only
+# formatted for display
+st.dataframe(
+    filtered[display_cols],
+    column_config={
+        "Renewal_Date": st.column_config.DateColumn(format="YYYY-MM-DD"),
+    },
+)
 
 st.markdown("---")
 st.markdown("#### Data Preview")